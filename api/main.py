@@ -1,24 +1,73 @@
+import json
 import os
 import sys
+import threading
+import zlib
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from query.chatbot_response import generate_chat_response
+from query.chatbot_response import (
+    generate_chat_response,
+    stream_chat_response,
+    summarize_conversation,
+)
 from query.query_db import search_db
 from data.create_db import add_chunks_to_chroma
 
+
+# Largest request body accepted once gzip-decompressed
+MAX_DECOMPRESSED_BODY_SIZE = 10 * 1024 * 1024
+
+
+class GzipRequest(Request):
+    """Request whose body is transparently gunzipped when sent compressed."""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if "gzip" in self.headers.getlist("Content-Encoding"):
+                # Bounded, so a small compression bomb can't exhaust memory
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                body = decompressor.decompress(body, MAX_DECOMPRESSED_BODY_SIZE)
+                if decompressor.unconsumed_tail:
+                    raise HTTPException(
+                        status_code=413, detail="Request body too large"
+                    )
+            self._body = body
+        return self._body
+
+
+class GzipRoute(APIRoute):
+    """Route that accepts gzip-compressed request bodies."""
+
+    def get_route_handler(self):
+        original_route_handler = super().get_route_handler()
+
+        async def gzip_route_handler(request: Request) -> Response:
+            request = GzipRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return gzip_route_handler
+
+
 app = FastAPI(
     title="TIPQIC RAG Chatbot API",
     description="API for the TIPQIC RAG Chatbot system",
     version="1.0.0",
 )
+# Accept compressed request bodies from the frontend on every route
+app.router.route_class = GzipRoute
 
 # Enable CORS for frontend communication
 app.add_middleware(
@@ -29,12 +78,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (chat answers with sources)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
     message: str
     max_results: Optional[int] = 5
     include_sources: Optional[bool] = True
+    session_id: Optional[str] = None
 
 
 class SourceInfo(BaseModel):
@@ -64,13 +117,120 @@ class DocumentChunk(BaseModel):
 
 
 
+NO_RESULTS_MESSAGE = "I couldn't find relevant information in the documents to answer your question. Could you try rephrasing it or asking about a different topic?"
+
+
+def build_sources(results, max_results: Optional[int]) -> List[SourceInfo]:
+    """Summarize the top search results for display as sources."""
+    sources_info = []
+    for doc, score in results[:max_results]:
+        source_filename = os.path.basename(doc.metadata.get("source", "Unknown"))
+        page = str(doc.metadata.get("page", "N/A"))
+        preview = doc.page_content[:200].replace("\n", " ").strip()
+
+        sources_info.append(
+            SourceInfo(
+                filename=source_filename,
+                page=page,
+                score=score,
+                preview=preview,
+            )
+        )
+    return sources_info
+
+
+# Conversation memory per frontend session: a summary of older turns plus
+# the recent (question, answer) pairs, for at most MAX_SESSIONS recently
+# active sessions. Once a session has more than MAX_HISTORY_TURNS turns, its
+# oldest HISTORY_FOLD_TURNS are folded into the summary by one LLM call that
+# runs as a background task after the response has been sent.
+MAX_HISTORY_TURNS = 10
+HISTORY_FOLD_TURNS = 5
+MAX_SESSIONS = 1000
+chat_histories: "OrderedDict[str, dict]" = OrderedDict()
+chat_histories_lock = threading.Lock()
+
+
+def get_history(session_id: Optional[str]) -> Tuple[str, List[Tuple[str, str]]]:
+    """Return the summary and a copy of the recent turns of a session."""
+    if not session_id:
+        return "", []
+    with chat_histories_lock:
+        session = chat_histories.get(session_id)
+        if session is None:
+            return "", []
+        return session["summary"], list(session["turns"])
+
+
+def remember_turn(session_id: Optional[str], question: str, answer: str):
+    """Append a turn to a session's history, evicting the least recent session."""
+    if not session_id:
+        return
+    with chat_histories_lock:
+        session = chat_histories.pop(session_id, None) or {
+            "summary": "",
+            "turns": [],
+            "folding": False,
+        }
+        session["turns"].append((question, answer))
+        chat_histories[session_id] = session
+        while len(chat_histories) > MAX_SESSIONS:
+            chat_histories.popitem(last=False)
+
+
+def fold_history(session_id: Optional[str]):
+    """
+    Summarize the oldest turns of a session once it has grown too long. Run
+    as a background task; the folded turns stay in the history until the
+    new summary replaces them, so concurrent requests always see one or the
+    other.
+    """
+    if not session_id:
+        return
+    with chat_histories_lock:
+        session = chat_histories.get(session_id)
+        if (
+            session is None
+            or session["folding"]
+            or len(session["turns"]) <= MAX_HISTORY_TURNS
+        ):
+            return
+        session["folding"] = True
+        summary = session["summary"]
+        folded = session["turns"][:HISTORY_FOLD_TURNS]
+
+    new_summary = None
+    try:
+        new_summary = summarize_conversation(summary, folded)
+    except Exception as e:
+        # Keep the turns; the next finished turn retries the fold
+        print(f"Error summarizing conversation: {str(e)}")
+    finally:
+        with chat_histories_lock:
+            if new_summary:
+                session["summary"] = new_summary
+                # Turns are only ever appended, so the folded ones are still first
+                del session["turns"][: len(folded)]
+            session["folding"] = False
+
+
+def sse_event(event: dict) -> str:
+    """Format a dict as a server-sent event."""
+    return f"data: {json.dumps(event)}\n\n"
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information."""
     return {
         "message": "TIPQIC RAG Chatbot API",
         "version": "1.0.0",
-        "endpoints": {"chat": "/api/chat", "health": "/api/health", "docs": "/docs"},
+        "endpoints": {
+            "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
+            "health": "/api/health",
+            "docs": "/docs",
+        },
     }
 
 
@@ -83,41 +243,33 @@ async def health_check():
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    """Main chat endpoint for processing user queries."""
+def chat_endpoint(request: ChatRequest, background_tasks: BackgroundTasks):
+    """
+    Main chat endpoint for processing user queries. A plain def, so FastAPI
+    runs the blocking search and LLM calls in its threadpool.
+    """
     try:
         # Search the database
         results = search_db(request.message)
         print(f"Search results are: {results}")
         if not results:
             return ChatResponse(
-                response="I couldn't find relevant information in the documents to answer your question. Could you try rephrasing it or asking about a different topic?",
+                response=NO_RESULTS_MESSAGE,
                 sources=[],
                 timestamp=datetime.now().isoformat(),
                 success=True,
             )
 
         # Generate AI response
-        ai_response = generate_chat_response(request.message, results)
+        summary, history = get_history(request.session_id)
+        ai_response = generate_chat_response(request.message, results, history, summary)
+        remember_turn(request.session_id, request.message, ai_response)
+        background_tasks.add_task(fold_history, request.session_id)
 
         # Prepare sources information
         sources_info = []
         if request.include_sources:
-            for doc, score in results[: request.max_results]:
-                source_filename = os.path.basename(
-                    doc.metadata.get("source", "Unknown")
-                )
-                page = str(doc.metadata.get("page", "N/A"))
-                preview = doc.page_content[:200].replace("\n", " ").strip()
-
-                sources_info.append(
-                    SourceInfo(
-                        filename=source_filename,
-                        page=page,
-                        score=score,
-                        preview=preview,
-                    )
-                )
+            sources_info = build_sources(results, request.max_results)
 
         return ChatResponse(
             response=ai_response,
@@ -138,10 +290,59 @@ async def chat_endpoint(request: ChatRequest):
             error_message=str(e),
         )
 
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, background_tasks: BackgroundTasks):
+    """
+    Streaming chat endpoint. Sends server-sent events: one "sources" event,
+    then "token" events as the answer is generated, then "done" (or "error").
+    """
+
+    def event_stream() -> Iterator[str]:
+        try:
+            results = search_db(request.message)
+            if not results:
+                yield sse_event({"type": "sources", "sources": []})
+                yield sse_event({"type": "token", "content": NO_RESULTS_MESSAGE})
+            else:
+                sources_info = []
+                if request.include_sources:
+                    sources_info = build_sources(results, request.max_results)
+                yield sse_event(
+                    {
+                        "type": "sources",
+                        "sources": [source.dict() for source in sources_info],
+                    }
+                )
+                summary, history = get_history(request.session_id)
+                answer_parts = []
+                for chunk in stream_chat_response(
+                    request.message, results, history, summary
+                ):
+                    answer_parts.append(chunk)
+                    yield sse_event({"type": "token", "content": chunk})
+                remember_turn(
+                    request.session_id, request.message, "".join(answer_parts)
+                )
+
+            yield sse_event({"type": "done", "timestamp": datetime.now().isoformat()})
+
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            yield sse_event({"type": "error", "message": str(e)})
+
+    # Runs once the stream has been sent, after the turn has been remembered
+    background_tasks.add_task(fold_history, request.session_id)
+    # Sync generator: Starlette iterates it in a threadpool, so the blocking
+    # search and LLM calls don't stall the event loop
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/api/add_chunks")
-async def add_chunks(chunks: List[DocumentChunk]):
+def add_chunks(chunks: List[DocumentChunk]):
     """
-    Endpoint to handle adding chunks to the Chroma database.
+    Endpoint to handle adding chunks to the Chroma database. A plain def, so
+    the blocking embedding and ingest run in FastAPI's threadpool.
     """
     try:
         # Convert Pydantic models to dictionaries
@@ -170,4 +371,4 @@ async def get_stats():
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("api.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,7 +1,12 @@
+import logging
+import math
 import os
+import queue
+import re
 import shutil
-import traceback
+import threading
 import tempfile
+import uuid
 from typing import List, Optional
 
 from dotenv import load_dotenv
@@ -12,25 +17,52 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 # Import multiple PDF loaders for fallback
 from langchain_community.document_loaders import (
+    PyMuPDFLoader,
     PyPDFium2Loader,
     PyPDFLoader,
     PDFMinerLoader,
     UnstructuredPDFLoader
 )
 
+logger = logging.getLogger(__name__)
+
 # OCR imports
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     from PIL import Image
     import pytesseract
     OCR_AVAILABLE = True
 except ImportError:
     OCR_AVAILABLE = False
-    print("Warning: OCR dependencies not available. Install pdf2image and pytesseract for OCR support.")
+    logger.warning("Warning: OCR dependencies not available. Install pdf2image and pytesseract for OCR support.")
 
 load_dotenv()
 # Use os.path.join for cross-platform path handling
 DATA_PATH = "./data/sources"
+# Matched case-insensitively so files like REPORT.PDF are not skipped
+_PDF_SUFFIXES = (".pdf",)
+# OCR rasterization limits: large-format pages get a lower DPI so each
+# page image stays around OCR_PIXEL_BUDGET pixels
+OCR_MAX_DPI = 300
+OCR_PIXEL_BUDGET = 4_000_000
+
+
+def get_ocr_dpi(pdf_file: str) -> int:
+    """
+    Pick a rasterization DPI that keeps a page under OCR_PIXEL_BUDGET pixels.
+    Falls back to OCR_MAX_DPI if the page size cannot be read.
+    """
+    try:
+        page_size = pdfinfo_from_path(pdf_file).get("Page size", "")
+        match = re.match(r"([\d.]+) x ([\d.]+)", page_size)
+        # Page size is reported in points (1/72 inch)
+        width_in = float(match.group(1)) / 72
+        height_in = float(match.group(2)) / 72
+        dpi = int(math.sqrt(OCR_PIXEL_BUDGET / (width_in * height_in)))
+    except Exception as e:
+        logger.debug("  - Could not read page size for %s: %s", pdf_file, e)
+        return OCR_MAX_DPI
+    return min(OCR_MAX_DPI, dpi)
 
 
 def load_pdf_with_ocr(pdf_file: str) -> List[Document]:
@@ -39,18 +71,20 @@ def load_pdf_with_ocr(pdf_file: str) -> List[Document]:
     Returns list of documents or empty list if OCR fails.
     """
     if not OCR_AVAILABLE:
-        print("  - OCR not available, skipping OCR loader")
+        logger.warning("  - OCR not available, skipping OCR loader")
         return []
     
     file_name = os.path.basename(pdf_file)
     documents = []
     
     try:
-        print(f"  - Converting PDF to images for OCR processing...")
+        logger.info("  - Converting PDF to images for OCR processing...")
         
         # Convert PDF to images
-        images = convert_from_path(pdf_file, dpi=300)
-        print(f"  - Converted to {len(images)} images")
+        dpi = get_ocr_dpi(pdf_file)
+        logger.info("  - Rasterizing at %s DPI", dpi)
+        images = convert_from_path(pdf_file, dpi=dpi)
+        logger.info("  - Converted to %s images", len(images))
         
         for page_num, image in enumerate(images):
             try:
@@ -70,23 +104,30 @@ def load_pdf_with_ocr(pdf_file: str) -> List[Document]:
                         }
                     )
                     documents.append(doc)
-                    print(f"    - OCR extracted text from page {page_num + 1}")
+                    logger.debug("    - OCR extracted text from page %s", page_num + 1)
                 else:
-                    print(f"    - Warning: No text extracted from page {page_num + 1}")
+                    logger.debug(
+                        "    - Warning: No text extracted from page %s",
+                        page_num + 1,
+                    )
                     
             except Exception as e:
-                print(f"    - Error processing page {page_num + 1} with OCR: {e}")
+                logger.warning(
+                    "    - Error processing page %s with OCR: %s",
+                    page_num + 1,
+                    e,
+                )
                 continue
         
         if documents:
-            print(f"  - OCR Success: {len(documents)} pages with content")
+            logger.info("  - OCR Success: %s pages with content", len(documents))
             return documents
         else:
-            print(f"  - OCR failed: No content extracted")
+            logger.warning("  - OCR failed: No content extracted")
             return []
             
     except Exception as e:
-        print(f"  - OCR failed: {e}")
+        logger.warning("  - OCR failed: %s", e)
         return []
 
 
@@ -98,8 +139,10 @@ def load_pdf_with_fallback(pdf_file: str) -> List[Document]:
     """
     file_name = os.path.basename(pdf_file)
     
-    # Define loaders in order of preference - PyPDFLoader first for Linux
+    # Define loaders in order of preference - PyMuPDF is the fastest parser,
+    # PyPDFLoader is the most reliable fallback on Linux
     loaders = [
+        ("PyMuPDFLoader", lambda: PyMuPDFLoader(pdf_file)),
         ("PyPDFLoader", lambda: PyPDFLoader(pdf_file)),
         ("PyPDFium2Loader", lambda: PyPDFium2Loader(pdf_file)),
         ("PDFMinerLoader", lambda: PDFMinerLoader(pdf_file)),
@@ -108,7 +151,7 @@ def load_pdf_with_fallback(pdf_file: str) -> List[Document]:
     
     for loader_name, loader_func in loaders:
         try:
-            print(f"  - Trying {loader_name} for {file_name}")
+            logger.debug("  - Trying %s for %s", loader_name, file_name)
             loader = loader_func()
             file_docs = loader.load()
             
@@ -118,64 +161,72 @@ def load_pdf_with_fallback(pdf_file: str) -> List[Document]:
                 if doc.page_content and doc.page_content.strip():
                     valid_docs.append(doc)
                 else:
-                    print(f"    - Warning: Empty page content found")
+                    logger.debug("    - Warning: Empty page content found")
             
             if valid_docs:
-                print(f"  - Success with {loader_name}: {len(valid_docs)} pages with content")
+                logger.info(
+                    "  - Success with %s: %s pages with content",
+                    loader_name,
+                    len(valid_docs),
+                )
                 return valid_docs
             else:
-                print(f"  - {loader_name} loaded {len(file_docs)} pages but all were empty")
+                logger.warning(
+                    "  - %s loaded %s pages but all were empty",
+                    loader_name,
+                    len(file_docs),
+                )
                 
         except ImportError as e:
-            print(f"  - {loader_name} not available: {e}")
+            logger.warning("  - %s not available: %s", loader_name, e)
             continue
         except Exception as e:
-            print(f"  - {loader_name} failed: {e}")
+            logger.warning("  - %s failed: %s", loader_name, e)
             continue
     
     # If all standard loaders failed, try OCR as last resort
-    print(f"  - All standard loaders failed, trying OCR for {file_name}")
+    logger.warning("  - All standard loaders failed, trying OCR for %s", file_name)
     ocr_docs = load_pdf_with_ocr(pdf_file)
     if ocr_docs:
         return ocr_docs
     
-    print(f"  - All loaders (including OCR) failed for {file_name}")
+    logger.error("  - All loaders (including OCR) failed for %s", file_name)
     return []
 
 
 def load_documents():
-    print("Loading PDF documents from a folder...")
-    print(f"Looking in: {os.path.abspath(DATA_PATH)}")
+    logger.info("Loading PDF documents from a folder...")
+    logger.info("Looking in: %s", os.path.abspath(DATA_PATH))
     
     if OCR_AVAILABLE:
-        print("OCR support: Available")
+        logger.info("OCR support: Available")
     else:
-        print("OCR support: Not available (install pdf2image and pytesseract)")
+        logger.warning("OCR support: Not available (install pdf2image and pytesseract)")
 
     if not os.path.exists(DATA_PATH):
-        print(f"ERROR: Directory {DATA_PATH} does not exist!")
+        logger.error("ERROR: Directory %s does not exist!", DATA_PATH)
         return []
 
     pdf_files = []
     for root, _, files in os.walk(DATA_PATH):
         for file in files:
-            if file.endswith(".pdf"):
+            if file.lower().endswith(_PDF_SUFFIXES):
                 pdf_files.append(os.path.join(root, file))
 
     if not pdf_files:
-        print(f"No PDF files found in {DATA_PATH}")
-        print("Available files:")
+        logger.warning("No PDF files found in %s", DATA_PATH)
+        logger.info("Available files:")
         try:
             for root, _, files in os.walk(DATA_PATH):
                 for file in files:
-                    print(f"  - {file}")
+                    logger.info("  - %s", file)
         except:
-            print("  - Unable to list files")
+            logger.warning("  - Unable to list files")
         return []
 
-    print(f"Found {len(pdf_files)} PDF files:")
+    logger.info("Found %s PDF files:", len(pdf_files))
     for pdf_file in pdf_files:
-        print(f"  - {pdf_file}")
+        logger.info("  - %s", pdf_file)
 
     documents = []
     successful_files = 0
@@ -183,7 +234,7 @@ def load_documents():
     
     for pdf_file in pdf_files:
         file_name = os.path.basename(pdf_file)
-        print(f"\nLoading: {file_name}")
+        logger.info("Loading: %s", file_name)
         
         file_docs = load_pdf_with_fallback(pdf_file)
         
@@ -194,35 +245,52 @@ def load_documents():
             # Check if OCR was used
             if any(doc.metadata.get('method') == 'OCR' for doc in file_docs):
                 ocr_successful_files += 1
-                print(f"  - Successfully loaded {len(file_docs)} pages from {file_name} (using OCR)")
+                logger.info(
+                    "  - Successfully loaded %s pages from %s (using OCR)",
+                    len(file_docs),
+                    file_name,
+                )
             else:
-                print(f"  - Successfully loaded {len(file_docs)} pages from {file_name}")
+                logger.info(
+                    "  - Successfully loaded %s pages from %s",
+                    len(file_docs),
+                    file_name,
+                )
             
             # Debug: Show sample content from first document
             if file_docs[0].page_content:
                 sample_content = file_docs[0].page_content[:100].replace('\n', ' ')
-                print(f"  - Sample content: {sample_content}...")
+                logger.info("  - Sample content: %s...", sample_content)
         else:
-            print(f"  - Failed to load any content from {file_name}")
+            logger.warning("  - Failed to load any content from %s", file_name)
 
-    print(f"\nSUMMARY: Successfully loaded {len(documents)} pages from {successful_files}/{len(pdf_files)} PDF files")
+    logger.info(
+        "SUMMARY: Successfully loaded %s pages from %s/%s PDF files",
+        len(documents),
+        successful_files,
+        len(pdf_files),
+    )
     if ocr_successful_files > 0:
-        print(f"OCR was used for {ocr_successful_files} files")
+        logger.info("OCR was used for %s files", ocr_successful_files)
     
     # Additional debugging for empty documents
     if documents:
         non_empty_docs = [doc for doc in documents if doc.page_content.strip()]
-        print(f"Documents with content: {len(non_empty_docs)}/{len(documents)}")
+        logger.info(
+            "Documents with content: %s/%s",
+            len(non_empty_docs),
+            len(documents),
+        )
         
         if len(non_empty_docs) < len(documents):
             empty_count = len(documents) - len(non_empty_docs)
-            print(f"Warning: {empty_count} documents have empty content")
+            logger.warning("Warning: %s documents have empty content", empty_count)
     
     return documents
 
 
 def split_text(documents: List[Document]):
-    print("\nSplit documents into chunks.")
+    logger.info("Split documents into chunks.")
     
     # Filter out empty documents before splitting
     valid_documents = []
@@ -230,12 +298,16 @@ def split_text(documents: List[Document]):
         if doc.page_content and doc.page_content.strip():
             valid_documents.append(doc)
         else:
-            print(f"Skipping empty document: {doc.metadata}")
+            logger.warning("Skipping empty document: %s", doc.metadata)
     
-    print(f"Processing {len(valid_documents)}/{len(documents)} non-empty documents")
+    logger.info(
+        "Processing %s/%s non-empty documents",
+        len(valid_documents),
+        len(documents),
+    )
     
     if not valid_documents:
-        print("ERROR: No valid documents to split!")
+        logger.error("ERROR: No valid documents to split!")
         return []
     
     text_splitter = RecursiveCharacterTextSplitter(
@@ -247,91 +319,154 @@ def split_text(documents: List[Document]):
 
     try:
         chunks = text_splitter.split_documents(valid_documents)
-        print(f"Split {len(valid_documents)} documents into {len(chunks)} chunks.")
+        logger.info(
+            "Split %s documents into %s chunks.",
+            len(valid_documents),
+            len(chunks),
+        )
         
         # Debug: Show sample chunk
         if chunks:
             sample_chunk = chunks[0].page_content[:100].replace('\n', ' ')
-            print(f"Sample chunk: {sample_chunk}...")
+            logger.info("Sample chunk: %s...", sample_chunk)
         
         return chunks
     except Exception as e:
-        print(f"ERROR splitting documents: {e}")
-        traceback.print_exc()
+        logger.exception("ERROR splitting documents: %s", e)
         return []
 
 
 CHROMA_PATH = "./chroma"
+# Number of chunks embedded per request while the previous batch is written
+EMBED_BATCH_SIZE = 100
 
 embeddings = GoogleGenerativeAIEmbeddings(
     model="models/text-embedding-004", task_type="retrieval_document"
 )
 
 
+def source_header(metadata: dict) -> str:
+    """
+    Format the "Source: X, Page: Y" line the chatbot puts above each chunk in
+    its context; stored in the chunk metadata so it isn't rebuilt per query.
+    """
+    header = f"Source: {metadata.get('source', 'Unknown')}"
+    if "page" in metadata:
+        header += f", Page: {metadata['page']}"
+    return header
+
+
+def add_documents_pipelined(db: Chroma, documents: List[Document]):
+    """
+    Embed documents in batches on the calling thread while a background
+    thread writes the previous batch to Chroma, so embedding API latency
+    overlaps with vector store writes.
+    """
+    batches = queue.Queue(maxsize=4)
+    errors = []
+
+    def writer():
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            # Keep draining after a failure so the producer never blocks
+            if errors:
+                continue
+            try:
+                db._collection.add(**item)
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    try:
+        for start in range(0, len(documents), EMBED_BATCH_SIZE):
+            if errors:
+                break
+            batch = documents[start:start + EMBED_BATCH_SIZE]
+            texts = [doc.page_content for doc in batch]
+            batches.put({
+                "ids": [str(uuid.uuid4()) for _ in batch],
+                "embeddings": embeddings.embed_documents(texts),
+                "documents": texts,
+                "metadatas": [
+                    {**doc.metadata, "source_header": source_header(doc.metadata)}
+                    for doc in batch
+                ],
+            })
+    finally:
+        batches.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
 def save_to_chroma(chunks: List[Document]):
-    print("\nSaving to ChromaDB...")
-    print(f"Database path: {os.path.abspath(CHROMA_PATH)}")
+    logger.info("Saving to ChromaDB...")
+    logger.info("Database path: %s", os.path.abspath(CHROMA_PATH))
     
     if not chunks:
-        print("ERROR: No chunks to save to database!")
+        logger.error("ERROR: No chunks to save to database!")
         return False
     
     try:
         # Remove existing database
         if os.path.exists(CHROMA_PATH):
-            print(f"Removing existing database at {CHROMA_PATH}")
+            logger.info("Removing existing database at %s", CHROMA_PATH)
             shutil.rmtree(CHROMA_PATH)
 
         # Create new database
-        print(f"Creating database with {len(chunks)} chunks...")
-        db = Chroma.from_documents(chunks, embeddings, persist_directory=CHROMA_PATH)
+        logger.info("Creating database with %s chunks...", len(chunks))
+        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
+        add_documents_pipelined(db, chunks)
         
-        print(f"SUCCESS: Saved {len(chunks)} chunks to {CHROMA_PATH}")
+        logger.info("SUCCESS: Saved %s chunks to %s", len(chunks), CHROMA_PATH)
         
         # Verify database was created
         if os.path.exists(CHROMA_PATH):
             files = os.listdir(CHROMA_PATH)
-            print(f"Database files created: {files}")
+            logger.info("Database files created: %s", files)
             return True
         else:
-            print("ERROR: Database directory was not created!")
+            logger.error("ERROR: Database directory was not created!")
             return False
             
     except Exception as e:
-        print(f"ERROR creating database: {e}")
-        traceback.print_exc()
+        logger.exception("ERROR creating database: %s", e)
         return False
 
 
 def create_vector_db():
-    print("Create vector DB from personal PDF files.")
-    print("=" * 60)
+    logger.info("Create vector DB from personal PDF files.")
+    logger.info("=" * 60)
     
     # Check environment
-    print(f"Current working directory: {os.getcwd()}")
-    print(f"GOOGLE_API_KEY set: {'GOOGLE_API_KEY' in os.environ}")
+    logger.info("Current working directory: %s", os.getcwd())
+    logger.info("GOOGLE_API_KEY set: %s", 'GOOGLE_API_KEY' in os.environ)
     
     documents = load_documents()
     
     if not documents:
-        print("FAILED: No documents loaded. Cannot create vector database.")
+        logger.error("FAILED: No documents loaded. Cannot create vector database.")
         return False
     
-    print("=" * 60)
+    logger.info("=" * 60)
     doc_chunks = split_text(documents)
     
     if not doc_chunks:
-        print("FAILED: No chunks created. Cannot create vector database.")
+        logger.error("FAILED: No chunks created. Cannot create vector database.")
         return False
     
-    print("=" * 60)
+    logger.info("=" * 60)
     success = save_to_chroma(doc_chunks)
     
     if success:
-        print("SUCCESS: Vector database creation completed!")
+        logger.info("SUCCESS: Vector database creation completed!")
         return True
     else:
-        print("FAILED: Vector database creation failed!")
+        logger.error("FAILED: Vector database creation failed!")
         return False
 
 
@@ -340,11 +475,11 @@ def get_chroma_db():
     """Get ChromaDB instance only when needed"""
     try:
         if not os.path.exists(CHROMA_PATH):
-            print(f"Database not found at {CHROMA_PATH}")
+            logger.info("Database not found at %s", CHROMA_PATH)
             return None
         return Chroma(persist_directory=CHROMA_PATH, embedding_function=embeddings)
     except Exception as e:
-        print(f"Error loading database: {e}")
+        logger.error("Error loading database: %s", e)
         return None
 
 
@@ -352,7 +487,7 @@ def add_chunks_to_chroma(chunks: List[dict]):
     """
     Add chunks to the Chroma database without clearing it.
     """
-    print("Adding chunks to the Chroma DB...")
+    logger.info("Adding chunks to the Chroma DB...")
     
     db = get_chroma_db()
     if not db:
@@ -363,16 +498,17 @@ def add_chunks_to_chroma(chunks: List[dict]):
 
     try:
         # Add the documents to the Chroma database
-        db.add_documents(documents)
+        add_documents_pipelined(db, documents)
         
-        print(f"Added {len(chunks)} chunks to the Chroma DB.")
+        logger.info("Added %s chunks to the Chroma DB.", len(chunks))
         return {"message": f"Successfully added {len(chunks)} chunks to the Chroma DB."}
     except Exception as e:
-        print(f"Error adding chunks: {e}")
+        logger.error("Error adding chunks: %s", e)
         return {"error": str(e)}
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     success = create_vector_db()
     if not success:
         print("\nTroubleshooting steps:")
@@ -3,8 +3,22 @@ import requests
 import json
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import time
+import gzip
+import socket
+import uuid
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+from config import load_config
+
+# Optional faster JSON decoding
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configure Streamlit page
 st.set_page_config(
@@ -14,21 +28,19 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# API Configuration - Support environment variables for dynamic IP
-def get_api_base_url():
-    """Get API base URL from environment variables or use defaults."""
-    # Try to get from environment variables first
-    api_host = os.getenv('API_HOST', 'localhost')
-    api_port = os.getenv('API_PORT', '8000')
-    
-    # If we're on EC2 and have a public IP, use it
-    if api_host == 'localhost' and os.getenv('EC2_PUBLIC_IP'):
-        api_host = os.getenv('EC2_PUBLIC_IP')
-    
-    return f"http://{api_host}:{api_port}"
+# Chat history limits: messages kept in session state, and messages rendered
+# per "load older" page
+MAX_STORED_MESSAGES = 200
+HISTORY_WINDOW = 20
 
-# Get the dynamic API base URL
-API_BASE_URL = get_api_base_url()
+@st.cache_data(show_spinner=False)
+def get_app_config() -> Dict:
+    """Load config.py / app_config.json once per process, not on every rerun."""
+    return load_config()
+
+# Minimum seconds between redraws of a streaming answer, from
+# stream_flush_interval_ms in config.py / app_config.json
+STREAM_FLUSH_INTERVAL = get_app_config()["stream_flush_interval_ms"] / 1000
 
 # Custom CSS for better UI
 st.markdown("""
@@ -39,20 +51,6 @@ st.markdown("""
         text-align: center;
         margin-bottom: 2rem;
     }
-    .chat-message {
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin: 0.5rem 0;
-        border-left: 4px solid #1f77b4;
-    }
-    .user-message {
-        background-color: #f0f2f6;
-        border-left-color: #ff6b6b;
-    }
-    .bot-message {
-        background-color: #e8f4fd;
-        border-left-color: #1f77b4;
-    }
     .source-card {
         background-color: #f8f9fa;
         padding: 1rem;
@@ -69,20 +67,113 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Default timeout (seconds) for API calls that don't pass their own
+DEFAULT_TIMEOUT = 10
+
+# Request bodies larger than this (bytes) are sent gzip-compressed
+GZIP_MIN_BODY_SIZE = 1024
+
+# Probe idle connections so NATs and load balancers don't drop them while a tab sits open
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+if hasattr(socket, "TCP_KEEPIDLE"):
+    KEEPALIVE_SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30))
+if hasattr(socket, "TCP_KEEPINTVL"):
+    KEEPALIVE_SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 10))
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter with TCP keepalive sockets and a default request timeout."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = KEEPALIVE_SOCKET_OPTIONS
+        return super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        # Session.send passes timeout=None explicitly when the caller gave none
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = DEFAULT_TIMEOUT
+        return super().send(request, **kwargs)
+
+@st.cache_resource
+def get_http() -> requests.Session:
+    """Get the pooled HTTP session shared by all Streamlit sessions in this process."""
+    session = requests.Session()
+    # Keep connections alive across reruns and retry transient gateway errors
+    adapter = KeepAliveAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        max_retries=Retry(
+            total=1, connect=1, backoff_factor=0.1, status_forcelist=[502, 503, 504]
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "Connection": "keep-alive",
+            "User-Agent": "TIPQIC-Chatbot/1.0",
+            # The API compresses with GZipMiddleware; urllib3 decodes it
+            "Accept-Encoding": "gzip",
+        }
+    )
+    return session
+
+def parse_json(response: requests.Response):
+    """Decode a JSON response body, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+def decode_json(data: str):
+    """Decode a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def encode_json_body(payload: Dict) -> tuple:
+    """Serialize a JSON request body and its headers, gzipping large bodies."""
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(body) > GZIP_MIN_BODY_SIZE:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+@st.cache_data(ttl=5, show_spinner=False)
 def check_api_health(api_base_url: str) -> bool:
     """Check if the API is running and healthy."""
     try:
-        response = requests.get(f"{api_base_url}/api/health", timeout=5)
+        response = get_http().get(f"{api_base_url}/api/health", timeout=(1.0, 2.0))
         return response.status_code == 200
     except requests.exceptions.RequestException:
         return False
 
+def is_api_available(api_base_url: str) -> bool:
+    """
+    Return the last known API status. The health endpoint is only probed when
+    the status is unknown; failing API calls mark the API as down.
+    """
+    if "api_down" not in st.session_state:
+        st.session_state.api_down = not check_api_health(api_base_url)
+    return not st.session_state.api_down
+
+def reconnect_api():
+    """Forget the known API status and stats so the next run probes the API again."""
+    check_api_health.clear()
+    get_api_stats.clear()
+    st.session_state.pop("api_down", None)
+
+@st.cache_data(ttl=15, show_spinner=False)
 def get_api_stats(api_base_url: str) -> Optional[Dict]:
     """Get API statistics."""
     try:
-        response = requests.get(f"{api_base_url}/api/stats", timeout=5)
+        response = get_http().get(f"{api_base_url}/api/stats", timeout=(1.0, 2.0))
         if response.status_code == 200:
-            return response.json()
+            return parse_json(response)
     except requests.exceptions.RequestException:
         pass
     return None
@@ -93,32 +184,90 @@ def send_chat_message(api_base_url: str, message: str, max_results: int = 5, inc
         payload = {
             "message": message,
             "max_results": max_results,
-            "include_sources": include_sources
+            "include_sources": include_sources,
+            "session_id": st.session_state.get("session_id")
         }
-        response = requests.post(
+        body, headers = encode_json_body(payload)
+        response = get_http().post(
             f"{api_base_url}/api/chat",
-            json=payload,
-            timeout=30
+            data=body,
+            headers=headers,
+            timeout=(3.0, 30.0)
         )
+        st.session_state.api_down = False
         if response.status_code == 200:
-            return response.json()
+            return parse_json(response)
         else:
             st.error(f"API Error: {response.status_code} - {response.text}")
     except requests.exceptions.RequestException as e:
+        st.session_state.api_down = True
         st.error(f"Connection Error: {str(e)}")
     return None
 
+def stream_chat_message(api_base_url: str, message: str, max_results: int = 5, include_sources: bool = True) -> Iterator[Dict]:
+    """
+    Send a chat message to the streaming endpoint and yield its events as they
+    arrive: {"type": "sources"}, then {"type": "token"} chunks, then "done" or
+    "error". Falls back to the blocking endpoint if the API doesn't stream.
+    """
+    payload = {
+        "message": message,
+        "max_results": max_results,
+        "include_sources": include_sources,
+        "session_id": st.session_state.get("session_id")
+    }
+    body, headers = encode_json_body(payload)
+    # Compressing the stream would buffer tokens
+    headers["Accept-Encoding"] = "identity"
+    try:
+        with get_http().post(
+            f"{api_base_url}/api/chat/stream",
+            data=body,
+            stream=True,
+            headers=headers,
+            timeout=(3.0, 300)
+        ) as response:
+            st.session_state.api_down = False
+            if response.status_code == 404:
+                # Older API without the streaming endpoint
+                response_data = send_chat_message(api_base_url, message, max_results, include_sources)
+                if response_data and response_data.get("success"):
+                    yield {"type": "sources", "sources": response_data.get("sources", [])}
+                    yield {"type": "token", "content": response_data["response"]}
+                    yield {"type": "done"}
+                elif response_data:
+                    yield {"type": "error", "message": response_data.get("error_message", "Unknown error")}
+                return
+            if response.status_code != 200:
+                yield {"type": "error", "message": f"API Error: {response.status_code} - {response.text}"}
+                return
+            # Events are UTF-8 JSON whatever charset the headers declare
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield decode_json(line[len("data: "):])
+    except requests.exceptions.RequestException as e:
+        st.session_state.api_down = True
+        yield {"type": "error", "message": f"Connection Error: {str(e)}"}
+
+def add_message(message: Dict):
+    """Append a message to the chat history, dropping the oldest past the cap."""
+    messages = st.session_state.messages
+    messages.append(message)
+    del messages[:-MAX_STORED_MESSAGES]
+
+def load_older_messages():
+    """Widen the rendered chat history by one page."""
+    st.session_state.history_window += HISTORY_WINDOW
+
 def display_chat_message(message: str, is_user: bool = True):
-    """Display a chat message with proper styling."""
-    css_class = "user-message" if is_user else "bot-message"
-    role = "👤 You" if is_user else "🤖 TIPQIC Bot"
-    
-    st.markdown(f"""
-    <div class="chat-message {css_class}">
-        <strong>{role}:</strong><br>
-        {message}
-    </div>
-    """, unsafe_allow_html=True)
+    """Display a chat message using Streamlit's chat elements."""
+    if is_user:
+        with st.chat_message("user", avatar="👤"):
+            st.markdown(message)
+    else:
+        with st.chat_message("assistant", avatar="🤖"):
+            st.markdown(message)
 
 def display_sources(sources: List[Dict]):
     """Display source information in a formatted way."""
@@ -129,9 +278,48 @@ def display_sources(sources: List[Dict]):
     
     for i, source in enumerate(sources, 1):
         with st.expander(f"Source {i}: {source['filename']} (Page {source['page']})"):
-            st.markdown(f"**File:** {source['filename']}")
-            st.markdown(f"**Page:** {source['page']}")
-            st.markdown(f"**Preview:** {source['preview']}")
+            # One markdown element per source instead of one per field
+            body = f"**File:** {source['filename']}\n\n**Page:** {source['page']}\n\n"
+            if isinstance(source.get("score"), (int, float)):
+                body += f"**Score:** {source['score']:.3f}\n\n"
+            body += f"**Preview:** {source['preview']}"
+            st.markdown(body)
+
+@st.fragment
+def show_sidebar(api_base_url: str, host: str, port: int):
+    """
+    Render the settings sidebar. As a fragment, its widgets rerun only the
+    sidebar; actions that change the chat page trigger a full rerun.
+    """
+    st.header("⚙️ Settings")
+
+    # API Health Check
+    if is_api_available(api_base_url):
+        st.success("✅ API is running")
+    else:
+        st.error("❌ API is not accessible")
+        st.info(f"Make sure the FastAPI server is running on http://{host}:{port}")
+        st.code("python api/main.py")
+
+    # The chat input's enabled state depends on the API status
+    if st.button("🔄 Refresh", on_click=reconnect_api):
+        st.rerun()
+
+    # Chat Settings, read by main() from session state when a message is sent.
+    # Inside a form, changes only rerun the app when applied.
+    st.subheader("Chat Settings")
+    with st.form("settings"):
+        st.slider("Max Results", min_value=1, max_value=10, value=5, key="max_results")
+        st.checkbox("Include Sources", value=True, key="include_sources")
+        st.form_submit_button("Apply")
+
+    # Clear Chat Button
+    if st.button("🗑️ Clear Chat History"):
+        st.session_state.messages = []
+        st.session_state.history_window = HISTORY_WINDOW
+        # A new session id starts a fresh conversation on the server
+        st.session_state.session_id = uuid.uuid4().hex
+        st.rerun()
 
 def main(host: str, port: int):
     # Set the API base URL for this session
@@ -141,36 +329,27 @@ def main(host: str, port: int):
     # Header
     st.markdown('<h1 class="main-header">🤖 TIVA</h1>', unsafe_allow_html=True)
     
-    # Sidebar
-    with st.sidebar:
-        st.header("⚙️ Settings")
-        
-        # API Health Check
-        api_healthy = check_api_health(api_base_url)
-        if api_healthy:
-            st.success("✅ API is running")
-        else:
-            st.error("❌ API is not accessible")
-            st.info(f"Make sure the FastAPI server is running on http://{host}:{port}")
-            st.code("python api/main.py")
-        
-        # Chat Settings
-        st.subheader("Chat Settings")
-        max_results = st.slider("Max Results", min_value=1, max_value=10, value=5)
-        include_sources = st.checkbox("Include Sources", value=True)
-        
-        # Clear Chat Button
-        if st.button("🗑️ Clear Chat History"):
-            st.session_state.messages = []
-            st.rerun()
-
     # Initialize chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "history_window" not in st.session_state:
+        st.session_state.history_window = HISTORY_WINDOW
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+
+    # Sidebar
+    with st.sidebar:
+        show_sidebar(api_base_url, host, port)
+    api_healthy = is_api_available(api_base_url)
+    max_results = st.session_state.max_results
+    include_sources = st.session_state.include_sources
 
     # Main chat interface
-    # Display chat history
-    for message in st.session_state.messages:
+    # Display the most recent part of the chat history
+    window = st.session_state.history_window
+    if len(st.session_state.messages) > window:
+        st.button("⬆️ Load older messages", on_click=load_older_messages)
+    for message in st.session_state.messages[-window:]:
         if message["role"] == "user":
             display_chat_message(message["content"], is_user=True)
         else:
@@ -180,32 +359,58 @@ def main(host: str, port: int):
     
     # Chat input
     if prompt := st.chat_input("Ask me anything about TIPQIC...", disabled=not api_healthy):
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        display_chat_message(prompt, is_user=True)
+        # Add user message to chat history. Resubmitting while a request is in
+        # flight interrupts that run and leaves its prompt unanswered as the
+        # last entry; reuse it instead of adding a duplicate turn.
+        user_message = {"role": "user", "content": prompt}
+        if st.session_state.messages[-1:] != [user_message]:
+            add_message(user_message)
+            display_chat_message(prompt, is_user=True)
         
-        # Get bot response
-        with st.spinner("🤔 Thinking..."):
-            response = send_chat_message(api_base_url, prompt, max_results, include_sources)
-        
-        if response and response.get("success"):
+        # Stream the bot response into place as it arrives
+        placeholder = st.empty()
+        with placeholder:
+            display_chat_message("🤔 Thinking...", is_user=False)
+
+        events = stream_chat_message(api_base_url, prompt, max_results, include_sources)
+
+        answer = ""
+        sources = []
+        error_message = None
+        # Batch tokens so the placeholder is redrawn at most once per interval
+        last_flush = 0.0
+        for event in events:
+            if event["type"] == "token":
+                answer += event["content"]
+                if time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+                    with placeholder:
+                        display_chat_message(answer, is_user=False)
+                    last_flush = time.monotonic()
+            elif event["type"] == "sources":
+                sources = event["sources"]
+            elif event["type"] == "error":
+                error_message = event["message"]
+
+        if error_message:
+            placeholder.empty()
+            st.error(f"Error: {error_message}")
+        elif answer:
+            # Draw any tokens that arrived since the last flush
+            with placeholder:
+                display_chat_message(answer, is_user=False)
+
             # Add bot response to chat history
             bot_message = {
                 "role": "assistant",
-                "content": response["response"],
-                "sources": response.get("sources", [])
+                "content": answer,
+                "sources": sources
             }
-            st.session_state.messages.append(bot_message)
-            
-            # Display bot response
-            display_chat_message(response["response"], is_user=False)
-            if include_sources and response.get("sources"):
-                display_sources(response["sources"])
-        
-        elif response and not response.get("success"):
-            error_msg = f"Error: {response.get('error_message', 'Unknown error')}"
-            st.error(error_msg)
+            add_message(bot_message)
+
+            if include_sources and sources:
+                display_sources(sources)
         else:
+            placeholder.empty()
             st.error("Failed to get response from the chatbot. Please try again.")
 
     # Footer
@@ -222,9 +427,16 @@ def main(host: str, port: int):
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
+    config = get_app_config()
+    # Environment variables override config.py; a localhost API host is
+    # replaced by the EC2 public IP when one is set
+    default_host = os.getenv("API_HOST", config["api_host"])
+    if default_host == "localhost" and os.getenv("EC2_PUBLIC_IP"):
+        default_host = os.getenv("EC2_PUBLIC_IP")
+    default_port = int(os.getenv("API_PORT", config["api_port"]))
     parser = ArgumentParser(description="Streamlit Chatbot")
-    parser.add_argument("--host", type=str, default="localhost", help="Host to run the Streamlit app")
-    parser.add_argument("--port", type=int, default=8000, help="Port to run the backend")
+    parser.add_argument("--host", type=str, default=default_host, help="Host to run the Streamlit app")
+    parser.add_argument("--port", type=int, default=default_port, help="Port to run the backend")
     args = parser.parse_args()
 
     main(args.host, args.port)
\ No newline at end of file
@@ -11,7 +11,8 @@ from pathlib import Path
 DEFAULT_CONFIG = {
     "api_host": "localhost",
     "api_port": 8000,
-    "frontend_port": 8501
+    "frontend_port": 8501,
+    "stream_flush_interval_ms": 32
 }
 
 CONFIG_FILE = Path(__file__).parent / "app_config.json"
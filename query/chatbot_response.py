@@ -1,27 +1,15 @@
 import os
+from functools import lru_cache
+from typing import Iterator, Sequence, Tuple
 
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from query.query_db import search_db
+from query.response_cache import cache_response, get_cached_response, make_cache_key
 
+CHAT_MODEL = "gemini-2.0-flash"
 
-def generate_chat_response(query: str, retrieved_docs) -> str:
-    """Generate a chat-like response using retrieved documents as context."""
-
-    # Combine the content from retrieved documents
-    context_parts = []
-    for doc, score in retrieved_docs:
-        # Include source information in context
-        source_info = f"Source: {doc.metadata.get('source', 'Unknown')}"
-        if "page" in doc.metadata:
-            source_info += f", Page: {doc.metadata['page']}"
-
-        context_parts.append(f"{source_info}\n{doc.page_content}")
-
-    # Join all context
-    context = "\n\n---\n\n".join(context_parts)
-
-    # Create the prompt for the LLM
-    system_prompt = """You are a helpful assistant for the TIPQIC project. Use the provided context to answer questions accurately and helpfully. 
+SYSTEM_PROMPT = """You are a helpful assistant for the TIPQIC project. Use the provided context to answer questions accurately and helpfully. 
 
         Guidelines:
         - Answer based primarily on the provided context
@@ -31,44 +19,159 @@ def generate_chat_response(query: str, retrieved_docs) -> str:
         - If asked about something not in the context, use your background knowledge to fill in the gaps. Clearly note that.
     """
 
-    user_prompt = f"""Context from documents (may be empty):
-    {context}
 
-    User question:
-    {query}
+def format_doc(doc) -> str:
+    """Format a retrieved document as a context block with its source."""
+    # Include source information in context, preformatted at index time
+    # (data/create_db.py) except for chunks indexed before that was added
+    source_info = doc.metadata.get("source_header")
+    if source_info is None:
+        source_info = f"Source: {doc.metadata.get('source', 'Unknown')}"
+        if "page" in doc.metadata:
+            source_info += f", Page: {doc.metadata['page']}"
 
-    Instructions:
-    - First try to answer using the context above.
+    return f"{source_info}\n{doc.page_content}"
+
+
+# Fixed per-turn instructions, sent ahead of the context so every request
+# starts with the same bytes and the provider can reuse the cached prefix
+CHAT_INSTRUCTIONS = """Instructions:
+    - First try to answer using the context below.
     - If the context is insufficient, answer using your general knowledge.
     - If you used background knowledge, clearly note this.
     - Cite document sources only when they appear in the context.
     """
 
-    try:
-        # Initialize the chat model
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.7,
-            system_instruction=system_prompt,
-        )
+# Prompt templates, filled with str.format on each request
+CHAT_PROMPT_TEMPLATE = CHAT_INSTRUCTIONS + """
+    {summary}
+    Context from documents (may be empty):
+    {context}
 
-        # Prepend system prompt manually
-        composed_prompt = f"""[SYSTEM INSTRUCTION]
-        {system_prompt}
+    User question:
+    {query}
+    """
 
-        [USER MESSAGE]
-        {user_prompt}
-        """
+HISTORY_SUMMARY_TEMPLATE = "Summary of the earlier conversation:\n    {summary}\n"
 
-        # Generate response
-        response = llm.invoke(
-            composed_prompt
-        )  # Gemini doesn't use system messages the same way
+SUMMARY_PROMPT = """Summarize this conversation between a user and the TIPQIC assistant in a few sentences. Keep the facts, names and open questions the user may refer back to.
 
-        return response.content
+    Earlier summary (may be empty):
+    {summary}
 
-    except Exception as e:
-        return f"Error generating response: {e}"
+    Conversation:
+    {conversation}
+    """
+
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+
+def build_chat_messages(
+    query: str,
+    retrieved_docs,
+    history: Sequence[Tuple[str, str]] = (),
+    history_summary: str = "",
+) -> list[BaseMessage]:
+    """
+    Build the LLM messages: system prompt, earlier (question, answer) turns,
+    then instructions, summary of older turns and context with the new query last.
+    """
+
+    # Combine the content from retrieved documents
+    context = "\n\n---\n\n".join(format_doc(doc) for doc, _ in retrieved_docs)
+
+    summary = ""
+    if history_summary:
+        summary = HISTORY_SUMMARY_TEMPLATE.format(summary=history_summary)
+
+    user_prompt = CHAT_PROMPT_TEMPLATE.format(
+        summary=summary, context=context, query=query
+    )
+
+    messages = [SYSTEM_MESSAGE]
+    for question, answer in history:
+        messages.append(HumanMessage(content=question))
+        messages.append(AIMessage(content=answer))
+    messages.append(HumanMessage(content=user_prompt))
+    return messages
+
+
+@lru_cache(maxsize=1)
+def get_chat_llm() -> ChatGoogleGenerativeAI:
+    """Return the chat model used to answer questions, created on first use."""
+    return ChatGoogleGenerativeAI(
+        model=CHAT_MODEL,
+        temperature=0.7,
+    )
+
+
+def generate_chat_response(
+    query: str,
+    retrieved_docs,
+    history: Sequence[Tuple[str, str]] = (),
+    history_summary: str = "",
+) -> str:
+    """
+    Generate a chat-like response using retrieved documents as context.
+    Model errors are raised so callers don't mistake them for an answer.
+    """
+    messages = build_chat_messages(query, retrieved_docs, history, history_summary)
+    cache_key = make_cache_key(CHAT_MODEL, messages)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        return cached
+
+    llm = get_chat_llm()
+    response = llm.invoke(messages)
+    # Empty (e.g. blocked) replies are not cached, so a retry calls the model
+    if response.content:
+        cache_response(cache_key, response.content)
+    return response.content
+
+
+def stream_chat_response(
+    query: str,
+    retrieved_docs,
+    history: Sequence[Tuple[str, str]] = (),
+    history_summary: str = "",
+) -> Iterator[str]:
+    """
+    Stream a chat-like response as text chunks while the model generates it.
+    Model errors are raised, not yielded, so callers can report them apart
+    from the answer.
+    """
+    messages = build_chat_messages(query, retrieved_docs, history, history_summary)
+    cache_key = make_cache_key(CHAT_MODEL, messages)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    llm = get_chat_llm()
+    parts = []
+    for chunk in llm.stream(messages):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    # Only complete, non-empty answers are cached
+    answer = "".join(parts)
+    if answer:
+        cache_response(cache_key, answer)
+
+
+def summarize_conversation(summary: str, turns: Sequence[Tuple[str, str]]) -> str:
+    """
+    Fold earlier (question, answer) turns into a running conversation summary.
+    Model errors are raised so callers can keep the turns for a later attempt.
+    """
+    conversation = "\n\n".join(
+        f"User: {question}\nAssistant: {answer}" for question, answer in turns
+    )
+    llm = get_chat_llm()
+    response = llm.invoke(
+        SUMMARY_PROMPT.format(summary=summary, conversation=conversation)
+    )
+    return response.content
 
 
 # Update your main function
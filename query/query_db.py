@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from dotenv import load_dotenv
 from langchain.schema import Document
 from langchain_chroma import Chroma
@@ -6,12 +8,18 @@ from langchain_google_genai import GoogleGenerativeAIEmbeddings
 load_dotenv()
 
 
-# search the DB
-def search_db(query: str, db_path: str = "chroma/") -> list[Document]:
+@lru_cache(maxsize=4)
+def get_db(db_path: str = "chroma/") -> Chroma:
+    """Open the Chroma DB at db_path once and reuse it for later searches."""
     embeddings = GoogleGenerativeAIEmbeddings(
         model="models/text-embedding-004", task_type="retrieval_query"
     )
-    db = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    return Chroma(persist_directory=db_path, embedding_function=embeddings)
+
+
+# search the DB
+def search_db(query: str, db_path: str = "chroma/") -> list[Document]:
+    db = get_db(db_path)
 
     # Use the correct method for text similarity search with scores
     results = db.similarity_search_with_relevance_scores(query, k=5)
@@ -0,0 +1,45 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+# Most recent answers kept in memory
+MAX_CACHED_RESPONSES = 512
+
+_responses: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def make_cache_key(model: str, messages: Sequence[BaseMessage]) -> str:
+    """
+    Hash the model name and the exact prompt messages. The messages include the
+    prompt template, retrieved context, history and query, so any change to
+    one of them gives a new key.
+    """
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for message in messages:
+        digest.update(b"\x00")
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(str(message.content).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[str]:
+    """Return the cached answer for a key, if any."""
+    with _lock:
+        response = _responses.get(key)
+        if response is not None:
+            _responses.move_to_end(key)
+        return response
+
+
+def cache_response(key: str, response: str):
+    """Store an answer, evicting the least recently used one when full."""
+    with _lock:
+        _responses[key] = response
+        _responses.move_to_end(key)
+        while len(_responses) > MAX_CACHED_RESPONSES:
+            _responses.popitem(last=False)